@@ -1,6 +1,10 @@
 import json
 import os
 
+import instrumentation
+
+
+@instrumentation.timed('clean')
 def clean_paper(paper):
     """Remove unnecessary fields from paper to save space."""
     # Fields to keep in annotations
@@ -48,6 +52,7 @@ def clean_paper(paper):
 
 def clean_jsonl_file(input_file, output_file):
     """Clean all papers in a JSONL file."""
+    instrumentation.configure_from_env()
 
     total = 0
 
@@ -59,7 +64,8 @@ def clean_jsonl_file(input_file, output_file):
         with open(output_file, 'w', encoding='utf-8') as fout:
             for line in fin:
                 original_size += len(line)
-                paper = json.loads(line)
+                with instrumentation.timer('parse'):
+                    paper = json.loads(line)
                 cleaned_paper = clean_paper(paper)
                 cleaned_line = json.dumps(cleaned_paper, ensure_ascii=False) + '\n'
                 cleaned_size += len(cleaned_line)
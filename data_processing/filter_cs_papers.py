@@ -5,6 +5,9 @@ import gzip
 import urllib.request
 from dotenv import load_dotenv
 
+import instrumentation
+import streaming
+
 load_dotenv()
 api_key = os.getenv("S2ORC_API_KEY")
 
@@ -19,6 +22,9 @@ CS_KEYWORDS = [
     "security", "cryptography", "networking", "systems", "hci"
 ]
 
+# per-record size cap for bounded-memory runs (None = no cap), e.g. 50 * 1024 * 1024; larger records are skipped
+MAX_RECORD_BYTES = None
+
 def extract_title_and_text(paper):
     """
     Extract title and text from paper, handling both schema formats.
@@ -62,6 +68,7 @@ def extract_title_and_text(paper):
     return '', '', False
 
 
+@instrumentation.timed('match')
 def is_cs_paper(title, text, keywords):
     """Check if paper is CS-related based on title and text."""
     title_lower = title.lower()
@@ -75,6 +82,7 @@ def is_cs_paper(title, text, keywords):
     return any(k.lower() in text_sample for k in keywords)
 
 
+@instrumentation.timed('clean')
 def clean_paper(paper):
     """Remove unnecessary fields from paper to save space."""
     # Fields to keep in annotations
@@ -130,6 +138,8 @@ def write_papers_to_jsonl(papers, output_file):
 
 
 def main():
+    instrumentation.configure_from_env()
+
     # Resolve output path to data/ directory (relative to project root)
     script_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(script_dir)
@@ -187,8 +197,13 @@ def main():
 
         try:
             with urllib.request.urlopen(url) as response:
-                with gzip.GzipFile(fileobj=response) as gz:
-                    for line_num, raw in enumerate(gz, 1):
+                # download bytes/time are counted on the raw response, decompress on the gz lines
+                # (so decompress time includes the nested download reads)
+                source = instrumentation.CountingReader(response, 'download') if instrumentation.is_enabled() else response
+                with gzip.GzipFile(fileobj=source) as gz:
+                    lines = instrumentation.CountingReader(gz, 'decompress') if instrumentation.is_enabled() else gz
+                    # records are parsed straight from bytes, ones over MAX_RECORD_BYTES are skipped
+                    for line_num, paper in streaming.iter_papers(lines, MAX_RECORD_BYTES):
                         if document_count >= TARGET_PAPERS:
                             break
 
@@ -196,21 +211,16 @@ def main():
                         if line_num % 1000 == 0:
                             print(f"  Checked {line_num} papers in this file...", end='\r')
 
-                        line = raw.decode("utf-8").strip()
-                        if not line:
-                            continue
-
-                        try:
-                            paper = json.loads(line)
-                            papers_checked += 1
-
-                            # Extract title and text (handles both schemas)
-                            title, text, has_content = extract_title_and_text(paper)
+                        papers_checked += 1
+                        instrumentation.count('papers_checked', stage='parse')
 
-                            if not has_content:
-                                papers_without_content += 1
-                                continue
+                        # Extract title and text (handles both schemas)
+                        title, text, has_content = extract_title_and_text(paper)
 
+                        if not has_content:
+                            papers_without_content += 1
+                            instrumentation.count('papers_without_content', stage='match')
+                        else:
                             papers_with_content += 1
 
                             # Check if it's a CS paper
@@ -219,11 +229,11 @@ def main():
 
                                 write_papers_to_jsonl([paper], output_file)
                                 document_count += 1
+                                instrumentation.count('papers_matched', stage='match')
                                 written_this_url += 1
 
-                        except json.JSONDecodeError as e:
-                            print(f"\n  JSON decode error on line {line_num}: {e}")
-                            continue
+                        # drop the record before the next one is read
+                        del paper, title, text
 
             print(f"\n  File {url_index}: Wrote {written_this_url} CS papers")
             print(f"  Total CS papers found: {document_count}/{TARGET_PAPERS}")
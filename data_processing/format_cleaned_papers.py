@@ -3,11 +3,20 @@
 - Reads the char-offset indices from S2ORC format into full text
 - Turns offset and paragraph into section_title and text key:value pairs
 - Save each paper as its own JSON file in data/ dir.
+- MAX_RECORD_BYTES caps the size of a single record
 """
 
 import json
 import os
 
+import instrumentation
+import streaming
+
+# papers with fewer sections than this are skipped
+MIN_SECTIONS = 4
+# per-record size cap for bounded-memory runs (None = no cap), e.g. 50 * 1024 * 1024; larger records are skipped
+MAX_RECORD_BYTES = None
+
 
 def parse_annotation_list(data):
     if data is None:
@@ -147,38 +156,53 @@ def format_paper(paper):
     return formatted
 
 
-def main(input_file, output_dir):
+@instrumentation.timed('format')
+def save_formatted_paper(paper, output_dir):
+    """
+    Format a paper and write it to <output_dir>/<corpusid>.json.
+    Papers with fewer than MIN_SECTIONS sections are not written.
+
+    Returns (formatted paper, num_sections, output_path or None if skipped).
+    """
+    formatted = format_paper(paper)
+    num_sections = len(formatted['sections'])
+    if num_sections < MIN_SECTIONS:
+        return formatted, num_sections, None
+
+    output_path = os.path.join(output_dir, f"{formatted['corpusid']}.json")
+    with open(output_path, 'w', encoding='utf-8') as out:
+        json.dump(formatted, out, indent=2, ensure_ascii=False)
+
+    return formatted, num_sections, output_path
+
+
+def main(input_file, output_dir, max_record_bytes=MAX_RECORD_BYTES):
     """
     Processing section headers and corresponding paragraphs to align with summarization model pipeline.
+
+    Records over max_record_bytes are skipped without being read in full.
     """
+    instrumentation.configure_from_env()
     os.makedirs(output_dir, exist_ok=True)
     count = 0
 
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-
-            paper = json.loads(line)
-            formatted = format_paper(paper)
+    with open(input_file, 'rb') as f:
+        for _, paper in streaming.iter_papers(f, max_record_bytes):
+            formatted, num_sections, output_path = save_formatted_paper(paper, output_dir)
+            # drop the record before the next one is read
+            del paper
 
             corpusid = formatted['corpusid']
-
-            num_sections = len(formatted['sections'])
             title_preview = formatted['title'][:60]
             # remove those with few section numbers:
-            if num_sections < 4:
+            if output_path is None:
+                instrumentation.count('papers_skipped', stage='format')
                 print(f"[WARNING] Only {num_sections} sections found, skipping '{title_preview}...'\n")
                 continue
 
-            output_path = os.path.join(output_dir, f"{corpusid}.json")
-
-            with open(output_path, 'w', encoding='utf-8') as out:
-                json.dump(formatted, out, indent=2, ensure_ascii=False)
-
             print(f"[{count + 1}] {title_preview}... => data/{corpusid}.json ({num_sections} sections)\n")
             count += 1
+            instrumentation.count('papers_formatted', stage='format')
 
     print(f"\nSuccessfully formatted {count} papers into {output_dir}/")
 
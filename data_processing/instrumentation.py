@@ -0,0 +1,337 @@
+"""
+- Lightweight per-stage instrumentation for the data processing and model pipeline
+- Counters, timers and histograms usable as context managers or decorators
+- Exports to a Prometheus text file (.prom/.txt) or JSON (.json)
+- Opt-in cProfile / tracemalloc capture for selected stages
+
+Everything is a no-op until enabled, either by calling enable() or by calling
+configure_from_env() with these environment variables set (e.g. in .env):
+
+    PIPELINE_METRICS=data/metrics.prom     # enable + write metrics at exit
+    PIPELINE_PROFILE=parse,generate        # cProfile these stages ('all' for every stage)
+    PIPELINE_PROFILE_DIR=data/profiles     # where <stage>.prof files are written
+    PIPELINE_TRACEMALLOC=1                 # record peak allocated bytes per stage
+
+Stage names used across the pipeline: download, decompress, parse, match,
+clean, format, textrank, tokenize, generate, decode (BART output), index (BM25 build), retrieve.
+"""
+
+import atexit
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# upper bounds (seconds) for stage duration histograms
+DEFAULT_TIME_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+# upper bounds (bytes) for size histograms (record bytes, peak memory)
+DEFAULT_SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9)
+
+_enabled = False
+_lock = threading.Lock()
+
+_counters = {}    # (name, stage) -> float
+_histograms = {}  # (name, stage) -> {'buckets', 'counts', 'sum', 'count'}
+
+_profile_stages = set()
+_profile_dir = None
+_profilers = {}   # stage -> cProfile.Profile (accumulated across calls)
+_profiling_active = False
+_trace_memory = False
+_started_tracemalloc = False
+_configured = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(profile=None, profile_dir=None, trace_memory=False):
+    """
+    Turn instrumentation on.
+
+    profile: iterable of stage names to capture with cProfile ('all' for every stage)
+    profile_dir: directory for <stage>.prof dumps (defaults to the working directory)
+    trace_memory: record peak tracemalloc growth per stage as a histogram
+                  (nested stages reset the peak, so the outer stage only sees what follows them)
+    """
+    global _enabled, _profile_dir, _trace_memory, _started_tracemalloc
+    _enabled = True
+    if profile:
+        _profile_stages.update(s.strip() for s in profile if s.strip())
+    if profile_dir:
+        _profile_dir = profile_dir
+    if trace_memory:
+        _trace_memory = True
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracemalloc = True
+
+
+def disable():
+    global _enabled, _trace_memory, _started_tracemalloc
+    _enabled = False
+    _trace_memory = False
+    _profile_stages.clear()
+    if _started_tracemalloc:
+        tracemalloc.stop()
+        _started_tracemalloc = False
+
+
+def reset():
+    """Drop all recorded metrics and profiles (keeps enabled/disabled state)."""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _profilers.clear()
+
+
+def count(name, value=1, stage=""):
+    """Increment a counter, e.g. count('bytes', len(raw), stage='download')."""
+    if not _enabled:
+        return
+    key = (name, stage)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, stage="", buckets=DEFAULT_TIME_BUCKETS):
+    """Record a single value into a histogram."""
+    if not _enabled:
+        return
+    key = (name, stage)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = {'buckets': tuple(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            _histograms[key] = hist
+        for i, bound in enumerate(hist['buckets']):
+            if value <= bound:
+                hist['counts'][i] += 1
+                break
+        hist['sum'] += value
+        hist['count'] += 1
+
+
+class _NullTimer:
+    """Shared no-op stand-in returned while instrumentation is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    def __init__(self, stage):
+        self.stage = stage
+        self._profiler = None
+        self._start = 0.0
+        self._start_memory = 0
+
+    def __enter__(self):
+        global _profiling_active
+        # only one cProfile can run at a time, so nested stages are covered by the outer one
+        if not _profiling_active and ('all' in _profile_stages or self.stage in _profile_stages):
+            with _lock:
+                if self.stage not in _profilers:
+                    _profilers[self.stage] = cProfile.Profile()
+                self._profiler = _profilers[self.stage]
+            _profiling_active = True
+            self._profiler.enable()
+        if _trace_memory:
+            tracemalloc.reset_peak()
+            self._start_memory = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        global _profiling_active
+        elapsed = time.perf_counter() - self._start
+        if self._profiler is not None:
+            self._profiler.disable()
+            _profiling_active = False
+        observe('stage_seconds', elapsed, stage=self.stage)
+        if _trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            # peak growth over what was already allocated when the stage started
+            observe('stage_peak_memory_bytes', peak - self._start_memory, stage=self.stage, buckets=DEFAULT_SIZE_BUCKETS)
+        if exc_type is not None:
+            count('errors', stage=self.stage)
+        return False
+
+
+def timer(stage):
+    """
+    Time a block of code as one pipeline stage:
+
+        with timer('parse'):
+            paper = json.loads(line)
+    """
+    if not _enabled:
+        return _NULL_TIMER
+    return _StageTimer(stage)
+
+
+def timed(stage):
+    """Decorator form of timer(); the enabled check happens per call."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _StageTimer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class CountingReader:
+    """File-like wrapper that counts bytes read (and time spent reading) as a stage, e.g. download or decompress."""
+
+    def __init__(self, fileobj, stage):
+        self._fileobj = fileobj
+        self._stage = stage
+
+    def read(self, *args):
+        with timer(self._stage):
+            data = self._fileobj.read(*args)
+        count('bytes', len(data), stage=self._stage)
+        return data
+
+    def readline(self, *args):
+        with timer(self._stage):
+            data = self._fileobj.readline(*args)
+        count('bytes', len(data), stage=self._stage)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+
+def snapshot():
+    """Current metrics as a JSON-serialisable dict."""
+    with _lock:
+        counters = [
+            {'name': name, 'stage': stage, 'value': value}
+            for (name, stage), value in sorted(_counters.items())
+        ]
+        histograms = [
+            {
+                'name': name,
+                'stage': stage,
+                'buckets': list(h['buckets']),
+                'counts': list(h['counts']),
+                'sum': h['sum'],
+                'count': h['count'],
+            }
+            for (name, stage), h in sorted(_histograms.items())
+        ]
+    return {'counters': counters, 'histograms': histograms}
+
+
+def _labels(stage, **extra):
+    pairs = [('stage', stage)] if stage else []
+    pairs.extend(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+def to_prometheus(prefix="pipeline"):
+    """Render current metrics in the Prometheus text exposition format."""
+    snap = snapshot()
+    lines = []
+    typed = set()
+
+    for c in snap['counters']:
+        metric = f"{prefix}_{c['name']}_total"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} counter")
+            typed.add(metric)
+        lines.append(f"{metric}{_labels(c['stage'])} {c['value']}")
+
+    for h in snap['histograms']:
+        metric = f"{prefix}_{h['name']}"
+        if metric not in typed:
+            lines.append(f"# TYPE {metric} histogram")
+            typed.add(metric)
+        cumulative = 0
+        for bound, n in zip(h['buckets'], h['counts']):
+            cumulative += n
+            lines.append(f"{metric}_bucket{_labels(h['stage'], le=bound)} {cumulative}")
+        lines.append(f"{metric}_bucket{_labels(h['stage'], le='+Inf')} {h['count']}")
+        lines.append(f"{metric}_sum{_labels(h['stage'])} {h['sum']}")
+        lines.append(f"{metric}_count{_labels(h['stage'])} {h['count']}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path):
+    """Write metrics to path: JSON if it ends in .json, Prometheus text otherwise."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith('.json'):
+            json.dump(snapshot(), f, indent=2)
+        else:
+            f.write(to_prometheus())
+
+
+def write_profiles(output_dir=None):
+    """Dump each captured stage profile to <output_dir>/<stage>.prof (readable with pstats)."""
+    output_dir = output_dir or _profile_dir or '.'
+    os.makedirs(output_dir, exist_ok=True)
+    with _lock:
+        profilers = dict(_profilers)
+    for stage, profiler in profilers.items():
+        profiler.dump_stats(os.path.join(output_dir, f"{stage}.prof"))
+
+
+def _flush_at_exit(metrics_path):
+    write_metrics(metrics_path)
+    if _profilers:
+        write_profiles()
+
+
+def configure_from_env():
+    """
+    Enable instrumentation from PIPELINE_* environment variables (see module docstring),
+    loading .env first (when python-dotenv is installed) so every entry point picks them up;
+    repeated calls are no-ops.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # e.g. a notebook that didn't install it: plain env vars still work
+        pass
+    else:
+        load_dotenv()
+    metrics_path = os.getenv('PIPELINE_METRICS')
+    profile = os.getenv('PIPELINE_PROFILE')
+    trace_memory = os.getenv('PIPELINE_TRACEMALLOC', '').lower() in ('1', 'true', 'yes')
+
+    if not (metrics_path or profile or trace_memory):
+        return
+
+    enable(
+        profile=profile.split(',') if profile else None,
+        profile_dir=os.getenv('PIPELINE_PROFILE_DIR'),
+        trace_memory=trace_memory,
+    )
+    if metrics_path:
+        atexit.register(_flush_at_exit, metrics_path)
+    elif profile:
+        atexit.register(write_profiles)
@@ -0,0 +1,73 @@
+"""
+- Bounded-memory reading of JSONL records (S2ORC shards, cs_papers.jsonl, papers_cleaned.jsonl)
+- Records are read as raw bytes with a per-record size cap, so one huge record
+  (theses, very long appendices) never has to be held in memory in full
+- Records over the cap are skipped: their full text is what makes them large, so a
+  truncated prefix would have no usable text for matching or sectioning
+"""
+
+import json
+
+import instrumentation
+
+# size of the reads used to drain the rest of an oversized record
+DRAIN_CHUNK_BYTES = 1024 * 1024
+
+
+def read_records(fileobj, max_record_bytes=None):
+    """
+    Yield (line_num, raw) for each non-empty line of a binary JSONL stream.
+
+    - max_record_bytes=None reads every record in full (same as iterating the file)
+    - records longer than max_record_bytes are skipped without being buffered past the cap
+    """
+    if max_record_bytes is not None and max_record_bytes <= 0:
+        raise ValueError(f"max_record_bytes must be positive, got {max_record_bytes}")
+    limit = max_record_bytes + 1 if max_record_bytes is not None else -1
+
+    line_num = 0
+    while True:
+        raw = fileobj.readline(limit)
+        if not raw:
+            return
+        line_num += 1
+
+        if max_record_bytes is not None and len(raw) > max_record_bytes and not raw.endswith(b'\n'):
+            # oversized: throw away the rest of the line in fixed-size chunks
+            skipped = len(raw)
+            del raw
+            while True:
+                rest = fileobj.readline(DRAIN_CHUNK_BYTES)
+                skipped += len(rest)
+                if not rest or rest.endswith(b'\n'):
+                    break
+            instrumentation.observe('oversized_record_bytes', skipped, stage='parse',
+                                    buckets=instrumentation.DEFAULT_SIZE_BUCKETS)
+            instrumentation.count('records_skipped', stage='parse')
+            print(f"[WARNING] Record on line {line_num} is {skipped:,} bytes "
+                  f"(cap {max_record_bytes:,}), skipping")
+            continue
+
+        # json.loads accepts surrounding whitespace, so avoid a stripped copy of the record
+        if not raw.isspace():
+            yield line_num, raw
+        # release the record before reading the next one
+        del raw
+
+
+def iter_papers(fileobj, max_record_bytes=None):
+    """
+    Yield (line_num, paper) from a binary JSONL stream, printing and skipping undecodable lines.
+    Records are parsed straight from bytes, so no decoded line is kept alongside the dict.
+    """
+    for line_num, raw in read_records(fileobj, max_record_bytes):
+        try:
+            with instrumentation.timer('parse'):
+                paper = json.loads(raw)
+        except json.JSONDecodeError as e:
+            instrumentation.count('json_decode_errors', stage='parse')
+            print(f"\n  JSON decode error on line {line_num}: {e}")
+            continue
+        del raw
+        yield line_num, paper
+        del paper
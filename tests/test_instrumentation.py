@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_processing"))
+
+import instrumentation  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state(monkeypatch):
+    for name in ('PIPELINE_METRICS', 'PIPELINE_PROFILE', 'PIPELINE_PROFILE_DIR', 'PIPELINE_TRACEMALLOC'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(instrumentation, '_configured', False)
+    instrumentation.disable()
+    instrumentation.reset()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled_timer_is_shared_null_object():
+    assert instrumentation.timer('parse') is instrumentation._NULL_TIMER
+    assert instrumentation.timer('format') is instrumentation._NULL_TIMER
+
+    with instrumentation.timer('parse'):
+        instrumentation.count('papers', stage='parse')
+        instrumentation.observe('size', 10, stage='parse')
+    assert instrumentation.snapshot() == {'counters': [], 'histograms': []}
+
+
+def test_disabled_timed_decorator_passes_through():
+    @instrumentation.timed('clean')
+    def double(x):
+        return 2 * x
+
+    assert double(3) == 6
+    assert instrumentation.snapshot()['histograms'] == []
+
+    instrumentation.enable()
+    assert double(4) == 8
+    [hist] = instrumentation.snapshot()['histograms']
+    assert (hist['name'], hist['stage'], hist['count']) == ('stage_seconds', 'clean', 1)
+
+
+def test_prometheus_text_for_known_observations():
+    instrumentation.enable()
+    for value in (0.0005, 0.002, 0.05, 5):
+        instrumentation.observe('latency', value, stage='parse', buckets=(0.001, 0.01, 0.1))
+    instrumentation.count('papers', 2, stage='match')
+    instrumentation.count('papers', 3, stage='match')
+
+    assert instrumentation.to_prometheus() == (
+        '# TYPE pipeline_papers_total counter\n'
+        'pipeline_papers_total{stage="match"} 5\n'
+        '# TYPE pipeline_latency histogram\n'
+        'pipeline_latency_bucket{stage="parse",le="0.001"} 1\n'
+        'pipeline_latency_bucket{stage="parse",le="0.01"} 2\n'
+        'pipeline_latency_bucket{stage="parse",le="0.1"} 3\n'
+        'pipeline_latency_bucket{stage="parse",le="+Inf"} 4\n'
+        'pipeline_latency_sum{stage="parse"} 5.0525\n'
+        'pipeline_latency_count{stage="parse"} 4\n'
+    )
+
+
+def test_timer_counts_errors_and_still_records_time():
+    instrumentation.enable()
+    with pytest.raises(ValueError):
+        with instrumentation.timer('parse'):
+            raise ValueError("bad record")
+
+    snap = instrumentation.snapshot()
+    assert snap['counters'] == [{'name': 'errors', 'stage': 'parse', 'value': 1}]
+    [hist] = snap['histograms']
+    assert (hist['name'], hist['stage'], hist['count']) == ('stage_seconds', 'parse', 1)
+
+
+def test_counting_reader_counts_read_and_readline_bytes():
+    instrumentation.enable()
+    reader = instrumentation.CountingReader(io.BytesIO(b'first line\nsecond\n'), 'download')
+
+    assert reader.readline() == b'first line\n'
+    assert reader.read() == b'second\n'
+    assert reader.tell() == 18  # other attributes pass through
+
+    snap = instrumentation.snapshot()
+    assert snap['counters'] == [{'name': 'bytes', 'stage': 'download', 'value': 18}]
+    assert snap['histograms'][0]['count'] == 2
+
+
+def test_write_metrics_json_and_prometheus(tmp_path):
+    instrumentation.enable()
+    instrumentation.count('papers', stage='format')
+
+    json_path = tmp_path / 'out' / 'metrics.json'
+    prom_path = tmp_path / 'metrics.prom'
+    instrumentation.write_metrics(str(json_path))
+    instrumentation.write_metrics(str(prom_path))
+
+    with open(json_path, encoding='utf-8') as f:
+        assert json.load(f) == instrumentation.snapshot()
+    with open(prom_path, encoding='utf-8') as f:
+        assert f.read() == instrumentation.to_prometheus()
+
+
+def test_write_profiles_covers_nested_stages_with_outer_profile(tmp_path):
+    instrumentation.enable(profile=['format', 'parse'], profile_dir=str(tmp_path))
+    with instrumentation.timer('format'):
+        # only one cProfile can be active, so 'parse' is captured inside 'format'
+        with instrumentation.timer('parse'):
+            sum(range(1000))
+    with instrumentation.timer('match'):
+        pass
+
+    instrumentation.write_profiles()
+    assert os.listdir(tmp_path) == ['format.prof']
+
+
+def test_configure_from_env_runs_once_and_registers_flush(monkeypatch, tmp_path):
+    registered = []
+    monkeypatch.setattr(instrumentation.atexit, 'register', lambda *args: registered.append(args))
+    metrics_path = str(tmp_path / 'metrics.prom')
+    monkeypatch.setenv('PIPELINE_METRICS', metrics_path)
+
+    instrumentation.configure_from_env()
+    instrumentation.configure_from_env()
+
+    assert instrumentation.is_enabled()
+    assert registered == [(instrumentation._flush_at_exit, metrics_path)]
+
+
+def test_configure_from_env_stays_disabled_without_settings(monkeypatch):
+    registered = []
+    monkeypatch.setattr(instrumentation.atexit, 'register', lambda *args: registered.append(args))
+
+    instrumentation.configure_from_env()
+
+    assert not instrumentation.is_enabled()
+    assert registered == []
@@ -0,0 +1,148 @@
+import io
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+DATA_PROCESSING_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data_processing")
+sys.path.insert(0, DATA_PROCESSING_DIR)
+
+import format_cleaned_papers  # noqa: E402
+import streaming  # noqa: E402
+
+CAP = 100
+
+# the synthetic huge record and the RSS ceiling its run must stay under
+HUGE_RECORD_MB = 200
+RECORD_CAP_BYTES = 32 * 1024 * 1024
+RSS_CEILING_MB = 160
+
+
+def small_paper(corpusid):
+    text = "Intro\npara one.\nMethods\npara two.\nResults\npara three.\nEnd\npara four é."
+
+    def span(sub):
+        start = text.index(sub)
+        return {'start': start, 'end': start + len(sub)}
+
+    return {
+        'corpusid': corpusid,
+        'title': f'Small paper {corpusid}',
+        'authors': [{'name': 'A. Author'}],
+        'openaccessinfo': {'url': 'https://example.org', 'license': 'CCBY'},
+        'content': {
+            'text': text,
+            'annotations': {
+                'sectionheader': json.dumps([span(h) for h in ['Intro', 'Methods', 'Results', 'End']]),
+                'paragraph': json.dumps([span(p) for p in ['para one.', 'para two.', 'para three.', 'para four é.']]),
+            },
+        },
+    }
+
+
+def records(data, max_record_bytes=CAP):
+    return list(streaming.read_records(io.BytesIO(data), max_record_bytes))
+
+
+def test_read_records_keeps_record_at_cap():
+    line = b'x' * CAP
+    assert records(line + b'\n' + b'y\n') == [(1, line + b'\n'), (2, b'y\n')]
+
+
+def test_read_records_skips_record_at_cap_plus_one():
+    assert records(b'x' * (CAP + 1) + b'\n' + b'y\n') == [(2, b'y\n')]
+
+
+def test_read_records_at_eof_without_newline():
+    assert records(b'y\n' + b'x' * CAP) == [(1, b'y\n'), (2, b'x' * CAP)]
+    assert records(b'y\n' + b'x' * (CAP + 1)) == [(1, b'y\n')]
+
+
+def test_read_records_drains_oversized_record_past_chunk_size(monkeypatch):
+    monkeypatch.setattr(streaming, 'DRAIN_CHUNK_BYTES', 7)
+    assert records(b'x' * (CAP * 5) + b'\n' + b'y\n') == [(2, b'y\n')]
+
+
+def test_read_records_without_cap_skips_blank_lines():
+    assert records(b'a\n\n  \nb', max_record_bytes=None) == [(1, b'a\n'), (4, b'b')]
+
+
+def test_read_records_rejects_non_positive_cap():
+    with pytest.raises(ValueError):
+        records(b'a\n', max_record_bytes=0)
+
+
+def test_iter_papers_skips_undecodable_lines():
+    data = b'{"corpusid": 1}\nnot json\n{"corpusid": 2}\n'
+    assert list(streaming.iter_papers(io.BytesIO(data))) == [(1, {'corpusid': 1}), (3, {'corpusid': 2})]
+
+
+def test_save_formatted_paper_writes_sections(tmp_path):
+    formatted, num_sections, output_path = format_cleaned_papers.save_formatted_paper(small_paper(7), str(tmp_path))
+
+    assert num_sections == 4
+    assert output_path == os.path.join(str(tmp_path), '7.json')
+    with open(output_path, encoding='utf-8') as f:
+        written = json.load(f)
+    assert written == formatted
+    assert written['title'] == 'Small paper 7'
+    assert (written['url'], written['license']) == ('https://example.org', 'CCBY')
+    assert written['sections'] == [
+        {'section_title': 'Intro', 'text': 'para one.'},
+        {'section_title': 'Methods', 'text': 'para two.'},
+        {'section_title': 'Results', 'text': 'para three.'},
+        {'section_title': 'End', 'text': 'para four é.'},
+    ]
+
+
+def test_save_formatted_paper_skips_papers_with_few_sections(tmp_path):
+    paper = small_paper(7)
+    paper['content']['annotations']['sectionheader'] = '[]'
+    _, num_sections, output_path = format_cleaned_papers.save_formatted_paper(paper, str(tmp_path))
+    assert (num_sections, output_path) == (1, None)
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.fixture(scope='module')
+def huge_jsonl(tmp_path_factory):
+    """small paper, one ~200MB paper (written in pieces), small paper"""
+    path = tmp_path_factory.mktemp('huge') / 'papers.jsonl'
+    paragraph = "lorem ipsum dolor sit amet " * 40 + "\n"
+    encoded = json.dumps(paragraph)[1:-1]
+    num_paragraphs = HUGE_RECORD_MB * 1024 * 1024 // len(encoded)
+
+    headers, paragraphs = [], []
+    with open(path, 'w', encoding='utf-8') as out:
+        out.write(json.dumps(small_paper(1)) + '\n')
+        out.write('{"corpusid": 2, "title": "Huge", "content": {"text": "')
+        pos = 0
+        for i in range(num_paragraphs):
+            out.write(encoded)
+            if i % 1000 == 0:
+                headers.append({'start': pos, 'end': pos + 5})
+            paragraphs.append({'start': pos, 'end': pos + len(paragraph)})
+            pos += len(paragraph)
+        annotations = {'sectionheader': json.dumps(headers), 'paragraph': json.dumps(paragraphs)}
+        out.write('", "annotations": ' + json.dumps(annotations) + '}}\n')
+        out.write(json.dumps(small_paper(3)) + '\n')
+
+    assert os.path.getsize(path) > HUGE_RECORD_MB * 1024 * 1024
+    return path
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="ru_maxrss is reported in KB on Linux only")
+def test_format_huge_record_under_rss_ceiling(huge_jsonl, tmp_path):
+    script = (
+        "import resource, sys\n"
+        f"sys.path.insert(0, {DATA_PROCESSING_DIR!r})\n"
+        "import format_cleaned_papers\n"
+        f"format_cleaned_papers.main({str(huge_jsonl)!r}, {str(tmp_path)!r}, {RECORD_CAP_BYTES})\n"
+        "print('MAXRSS_KB', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True)
+
+    max_rss_kb = int(result.stdout.rsplit('MAXRSS_KB', 1)[1])
+    assert max_rss_kb / 1024 < RSS_CEILING_MB
+    assert sorted(os.listdir(tmp_path)) == ['1.json', '3.json']